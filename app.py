@@ -5,22 +5,58 @@ Integrantes:
 - Hiro Terato Ramos
 """
 
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, Response, render_template, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
+from waitress import serve
+import orjson
 import sqlite3
 import csv
+import io
+import math
 import os
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-import shutil
 import webbrowser
 import threading
+import time
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Provider JSON do Flask que serializa com orjson"""
+
+    def dumps(self, obj, **kwargs):
+        # Argumentos sem equivalente no orjson (ex.: ensure_ascii, indent=4) usam o provider padrão
+        indent = kwargs.get('indent')
+        if kwargs.keys() - {'sort_keys', 'indent', 'default'} or indent not in (None, 2):
+            return super().dumps(obj, **kwargs)
+
+        opcoes = orjson.OPT_SORT_KEYS if kwargs.get('sort_keys', self.sort_keys) else 0
+        if indent == 2:
+            opcoes |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=opcoes).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._serializar(obj), mimetype=self.mimetype)
+
+    def _serializar(self, obj):
+        opcoes = orjson.OPT_SORT_KEYS if self.sort_keys else 0
+        return orjson.dumps(obj, default=self.default, option=opcoes)
+
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+app.json.sort_keys = False  # orjson já gera JSON compacto; mantém a ordem das colunas
 CORS(app)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
+
+# Número de threads do servidor waitress
+SERVIDOR_THREADS = 8
 
 # Configuração dos diretórios
 BASE_DIR = Path("meu_sistema_livraria")
@@ -28,9 +64,42 @@ DATA_DIR = BASE_DIR / "data"
 BACKUPS_DIR = BASE_DIR / "backups"
 EXPORTS_DIR = BASE_DIR / "exports"
 REPORTS_DIR = BASE_DIR / "reports"
-UPLOAD_DIR = Path("uploads")
 DB_PATH = DATA_DIR / "livraria.db"
 
+# Formato de data/hora usado nos nomes de backups, exportações e relatórios
+FORMATO_TIMESTAMP = "%Y-%m-%d_%H-%M-%S"
+
+# PRAGMAs aplicados a cada conexão aberta (journal_mode=WAL fica gravado no arquivo)
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',
+    'PRAGMA mmap_size=268435456',
+)
+
+# Colunas de livros, na ordem usada pelas respostas, exportações e relatórios
+COLUNAS_LIVRO = 'id, titulo, autor, ano_publicacao, preco'
+
+SQL_INSERIR_LIVRO = '''
+    INSERT INTO livros (titulo, autor, ano_publicacao, preco)
+    VALUES (?, ?, ?, ?)
+'''
+
+# Quantidade de linhas enviadas por executemany na importação de CSV
+IMPORT_LOTE = 10_000
+
+# Quantidade de linhas acumuladas antes de cada envio na exportação de CSV
+EXPORT_LOTE = 1_000
+
+# Intervalo mínimo (segundos) entre backups automáticos
+BACKUP_INTERVALO = 60
+_ultimo_backup = None
+_backup_lock = threading.Lock()
+
+# Conexões SQLite reaproveitadas entre requisições (uma por thread)
+_local = threading.local()
+
 
 def criar_estrutura():
     """Cria a estrutura de diretórios"""
@@ -38,12 +107,18 @@ def criar_estrutura():
     os.makedirs(BACKUPS_DIR, exist_ok=True)
     os.makedirs(EXPORTS_DIR, exist_ok=True)
     os.makedirs(REPORTS_DIR, exist_ok=True)
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+def configurar_conexao(conn):
+    """Aplica os PRAGMAs de desempenho a uma conexão"""
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
 
 
 def inicializar_banco():
     """Inicializa o banco de dados"""
     conn = sqlite3.connect(DB_PATH)
+    configurar_conexao(conn)
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS livros (
@@ -54,30 +129,108 @@ def inicializar_banco():
             preco REAL NOT NULL
         )
     ''')
+    # Índice de cobertura: a busca por autor é respondida sem ler a tabela
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_livros_autor_cobertura
+        ON livros(autor COLLATE NOCASE, titulo, ano_publicacao, preco)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_livros_ano ON livros(ano_publicacao)')
     conn.commit()
+
+    # Totais do catálogo mantidos por triggers (linha única em livros_stats);
+    # a linha é semeada a partir dos dados existentes na primeira execução
+    cursor.executescript('''
+        BEGIN;
+        CREATE TABLE IF NOT EXISTS livros_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL,
+            soma_preco REAL NOT NULL
+        );
+        INSERT OR IGNORE INTO livros_stats (id, total, soma_preco)
+            SELECT 1, COUNT(*), COALESCE(SUM(preco), 0) FROM livros;
+        CREATE TRIGGER IF NOT EXISTS livros_stats_ai AFTER INSERT ON livros BEGIN
+            UPDATE livros_stats SET total = total + 1, soma_preco = soma_preco + NEW.preco;
+        END;
+        CREATE TRIGGER IF NOT EXISTS livros_stats_ad AFTER DELETE ON livros BEGIN
+            UPDATE livros_stats SET total = total - 1, soma_preco = soma_preco - OLD.preco;
+        END;
+        CREATE TRIGGER IF NOT EXISTS livros_stats_au AFTER UPDATE OF preco ON livros BEGIN
+            UPDATE livros_stats SET soma_preco = soma_preco - OLD.preco + NEW.preco;
+        END;
+        COMMIT;
+    ''')
+
+    # Atualiza as estatísticas usadas pelo otimizador de consultas
+    cursor.execute('ANALYZE')
     conn.close()
 
 
-def fazer_backup():
-    """Cria backup do banco de dados"""
+def get_conn():
+    """Retorna a conexão SQLite da thread atual, abrindo-a na primeira chamada"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        configurar_conexao(conn)
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def transacao_escrita():
+    """Abre uma transação BEGIN IMMEDIATE na conexão da thread (commit ou rollback ao sair)"""
+    conn = get_conn()
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        yield conn
+
+
+def gerar_timestamp(momento=None):
+    """Formata o momento (padrão: agora) para uso em nomes de arquivo"""
+    return (momento or datetime.now()).strftime(FORMATO_TIMESTAMP)
+
+
+def fazer_backup(forcar=False):
+    """Cria backup do banco de dados (no máximo um a cada BACKUP_INTERVALO segundos)"""
+    global _ultimo_backup
+
     if not DB_PATH.exists():
         return
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    backup_nome = f"backup_livraria_{timestamp}.db"
-    backup_path = BACKUPS_DIR / backup_nome
+    with _backup_lock:
+        agora = time.monotonic()
+        if not forcar and _ultimo_backup is not None and agora - _ultimo_backup < BACKUP_INTERVALO:
+            return
+
+        timestamp = gerar_timestamp()
+        backup_nome = f"backup_livraria_{timestamp}.db"
+        backup_path = BACKUPS_DIR / backup_nome
+
+        # API de backup online do SQLite: cópia consistente mesmo com WAL
+        destino = sqlite3.connect(backup_path)
+        try:
+            get_conn().backup(destino, pages=1024)
+        finally:
+            destino.close()
+
+        _ultimo_backup = agora
+        limpar_backups_antigos()
 
-    shutil.copy2(DB_PATH, backup_path)
-    limpar_backups_antigos()
+
+def listar_arquivos_backup():
+    """Retorna os backups (os.DirEntry) do mais recente para o mais antigo"""
+    with os.scandir(BACKUPS_DIR) as it:
+        backups = [e for e in it
+                   if e.name.startswith('backup_livraria_') and e.name.endswith('.db')]
+
+    backups.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    return backups
 
 
 def limpar_backups_antigos():
     """Mantém apenas os 5 backups mais recentes"""
-    backups = sorted(BACKUPS_DIR.glob("backup_livraria_*.db"),
-                    key=os.path.getmtime, reverse=True)
-
-    for backup in backups[5:]:
-        backup.unlink()
+    for backup in listar_arquivos_backup()[5:]:
+        os.unlink(backup.path)
 
 
 @app.route('/')
@@ -89,19 +242,10 @@ def index():
 @app.route('/api/livros', methods=['GET'])
 def listar_livros():
     """Lista todos os livros"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM livros ORDER BY id')
-    livros = cursor.fetchall()
-    conn.close()
+    cursor = get_conn().cursor()
+    cursor.execute(f'SELECT {COLUNAS_LIVRO} FROM livros ORDER BY id')
 
-    return jsonify([{
-        'id': l[0],
-        'titulo': l[1],
-        'autor': l[2],
-        'ano_publicacao': l[3],
-        'preco': l[4]
-    } for l in livros])
+    return jsonify([dict(l) for l in cursor])
 
 
 @app.route('/api/livros', methods=['POST'])
@@ -118,21 +262,17 @@ def adicionar_livro():
         if ano_publicacao < 0 or ano_publicacao > datetime.now().year:
             return jsonify({'erro': 'Ano de publicação inválido'}), 400
 
+        # inf/nan tornariam livros_stats.soma_preco inválida para os triggers
+        if not math.isfinite(preco):
+            return jsonify({'erro': 'Preço inválido'}), 400
+
         if preco < 0:
             return jsonify({'erro': 'Preço não pode ser negativo'}), 400
 
         fazer_backup()
 
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO livros (titulo, autor, ano_publicacao, preco)
-            VALUES (?, ?, ?, ?)
-        ''', (titulo, autor, ano_publicacao, preco))
-
-        livro_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with transacao_escrita() as conn:
+            livro_id = conn.execute(SQL_INSERIR_LIVRO, (titulo, autor, ano_publicacao, preco)).lastrowid
 
         return jsonify({
             'id': livro_id,
@@ -154,25 +294,20 @@ def atualizar_preco(id):
         dados = request.json
         novo_preco = float(dados['preco'])
 
+        if not math.isfinite(novo_preco):
+            return jsonify({'erro': 'Preço inválido'}), 400
+
         if novo_preco < 0:
             return jsonify({'erro': 'Preço não pode ser negativo'}), 400
 
         fazer_backup()
 
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM livros WHERE id = ?', (id,))
-        livro = cursor.fetchone()
+        with transacao_escrita() as conn:
+            cursor = conn.execute('UPDATE livros SET preco = ? WHERE id = ?', (novo_preco, id))
 
-        if not livro:
-            conn.close()
+        if cursor.rowcount == 0:
             return jsonify({'erro': 'Livro não encontrado'}), 404
 
-        cursor.execute('UPDATE livros SET preco = ? WHERE id = ?', (novo_preco, id))
-        conn.commit()
-        conn.close()
-
         return jsonify({'mensagem': 'Preço atualizado com sucesso!'}), 200
 
     except Exception as e:
@@ -185,20 +320,12 @@ def remover_livro(id):
     try:
         fazer_backup()
 
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM livros WHERE id = ?', (id,))
-        livro = cursor.fetchone()
+        with transacao_escrita() as conn:
+            cursor = conn.execute('DELETE FROM livros WHERE id = ?', (id,))
 
-        if not livro:
-            conn.close()
+        if cursor.rowcount == 0:
             return jsonify({'erro': 'Livro não encontrado'}), 404
 
-        cursor.execute('DELETE FROM livros WHERE id = ?', (id,))
-        conn.commit()
-        conn.close()
-
         return jsonify({'mensagem': 'Livro removido com sucesso!'}), 200
 
     except Exception as e:
@@ -207,67 +334,71 @@ def remover_livro(id):
 
 @app.route('/api/livros/buscar/<autor>', methods=['GET'])
 def buscar_por_autor(autor):
-    """Busca livros por autor"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM livros
+    """Busca livros por autor (use ?prefixo=1 para buscar pelo início do nome)"""
+    # A busca por prefixo faz uma busca por faixa no índice idx_livros_autor_cobertura;
+    # a busca por trecho do nome não pode usar a ordem do índice e confere todas as
+    # entradas (da tabela ou do próprio índice de cobertura, a critério do SQLite)
+    padrao = f'{autor}%' if request.args.get('prefixo') == '1' else f'%{autor}%'
+
+    cursor = get_conn().cursor()
+    cursor.execute(f'''
+        SELECT {COLUNAS_LIVRO} FROM livros
         WHERE autor LIKE ?
         ORDER BY titulo
-    ''', (f'%{autor}%',))
-    livros = cursor.fetchall()
-    conn.close()
+    ''', (padrao,))
 
-    return jsonify([{
-        'id': l[0],
-        'titulo': l[1],
-        'autor': l[2],
-        'ano_publicacao': l[3],
-        'preco': l[4]
-    } for l in livros])
+    return jsonify([dict(l) for l in cursor])
 
 
 @app.route('/api/exportar-csv', methods=['GET'])
 def exportar_csv():
-    """Exporta livros para CSV e retorna para download"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM livros ORDER BY id')
-    livros = cursor.fetchall()
-    conn.close()
+    """Exporta livros para CSV e envia o arquivo em streaming para download"""
+    cursor = get_conn().cursor()
+    cursor.execute(f'SELECT {COLUNAS_LIVRO} FROM livros ORDER BY id')
+    primeiro = cursor.fetchone()
 
-    if not livros:
+    if primeiro is None:
         return jsonify({'erro': 'Nenhum livro para exportar'}), 400
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    timestamp = gerar_timestamp()
     csv_filename = f"livros_exportados_{timestamp}.csv"
-    csv_path = EXPORTS_DIR / csv_filename
 
-    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
+    def gerar():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
         writer.writerow(['ID', 'Título', 'Autor', 'Ano de Publicação', 'Preço'])
-        writer.writerows(livros)
+        writer.writerow(primeiro)
+
+        # Percorre o cursor e envia o conteúdo a cada EXPORT_LOTE linhas
+        for idx, livro in enumerate(cursor, start=1):
+            writer.writerow(livro)
+            if idx % EXPORT_LOTE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        yield buffer.getvalue()
 
-    return send_file(csv_path, as_attachment=True, download_name=csv_filename, mimetype='text/csv')
+    return Response(gerar(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={csv_filename}'})
 
 
 @app.route('/api/backup', methods=['POST'])
 def criar_backup():
     """Cria um backup manual"""
-    fazer_backup()
+    fazer_backup(forcar=True)
     return jsonify({'mensagem': 'Backup criado com sucesso!'}), 200
 
 
 @app.route('/api/backups', methods=['GET'])
 def listar_backups():
     """Lista todos os backups disponíveis"""
-    backups = sorted(BACKUPS_DIR.glob("backup_livraria_*.db"),
-                    key=os.path.getmtime, reverse=True)
+    backups = listar_arquivos_backup()
 
     return jsonify([{
         'nome': b.name,
-        'data': datetime.fromtimestamp(os.path.getmtime(b)).strftime('%d/%m/%Y %H:%M:%S'),
-        'tamanho': f"{os.path.getsize(b) / 1024:.2f} KB"
+        'data': datetime.fromtimestamp(b.stat().st_mtime).strftime('%d/%m/%Y %H:%M:%S'),
+        'tamanho': f"{b.stat().st_size / 1024:.2f} KB"
     } for b in backups])
 
 
@@ -286,21 +417,25 @@ def importar_csv():
         if not file.filename.endswith('.csv'):
             return jsonify({'erro': 'Apenas arquivos CSV são permitidos'}), 400
 
-        # Salva o arquivo temporariamente
-        filename = secure_filename(file.filename)
-        filepath = UPLOAD_DIR / filename
-        file.save(filepath)
+        # Decodifica o upload em memória, sem gravá-lo em disco (o tamanho já é limitado por
+        # MAX_CONTENT_LENGTH); TextIOWrapper sobre file.stream falha no Python < 3.11, pois o
+        # SpooledTemporaryFile do Werkzeug não tem readable()
+        conteudo = file.read().decode('utf-8')
 
         # Faz backup antes de importar
         fazer_backup()
 
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
         importados = 0
         erros = []
+        linhas = []
 
-        with open(filepath, 'r', encoding='utf-8') as csvfile:
+        # Valores fixos durante a importação, calculados fora do laço
+        ano_atual = datetime.now().year
+        adicionar_erro = erros.append
+        adicionar_linha = linhas.append
+
+        with transacao_escrita() as conn, io.StringIO(conteudo, newline='') as csvfile:
+            cursor = conn.cursor()
             reader = csv.reader(csvfile)
             next(reader)  # Pula o cabeçalho
 
@@ -311,30 +446,31 @@ def importar_csv():
                         _, titulo, autor, ano, preco = row
                         ano = int(ano)
                         preco = float(preco)
+                    except ValueError as e:
+                        adicionar_erro(f"Linha {idx}: {str(e)}")
+                        continue
 
-                        # Validação
-                        if ano < 0 or ano > datetime.now().year:
-                            erros.append(f"Linha {idx}: Ano inválido ({ano})")
-                            continue
-
-                        if preco < 0:
-                            erros.append(f"Linha {idx}: Preço inválido ({preco})")
-                            continue
+                    # Validação
+                    if ano < 0 or ano > ano_atual:
+                        adicionar_erro(f"Linha {idx}: Ano inválido ({ano})")
+                        continue
 
-                        cursor.execute('''
-                            INSERT INTO livros (titulo, autor, ano_publicacao, preco)
-                            VALUES (?, ?, ?, ?)
-                        ''', (titulo, autor, ano, preco))
+                    # inf/nan fariam o INSERT falhar e desfazer a importação inteira
+                    if preco < 0 or not math.isfinite(preco):
+                        adicionar_erro(f"Linha {idx}: Preço inválido ({preco})")
+                        continue
 
-                        importados += 1
-                    except (ValueError, sqlite3.Error) as e:
-                        erros.append(f"Linha {idx}: {str(e)}")
+                    adicionar_linha((titulo, autor, ano, preco))
 
-        conn.commit()
-        conn.close()
+                    # Insere em lotes para limitar o uso de memória
+                    if len(linhas) >= IMPORT_LOTE:
+                        cursor.executemany(SQL_INSERIR_LIVRO, linhas)
+                        importados += len(linhas)
+                        linhas.clear()
 
-        # Remove o arquivo temporário
-        filepath.unlink()
+            if linhas:
+                cursor.executemany(SQL_INSERIR_LIVRO, linhas)
+                importados += len(linhas)
 
         resultado = {
             'mensagem': f'{importados} livro(s) importado(s) com sucesso!',
@@ -348,26 +484,8 @@ def importar_csv():
         return jsonify({'erro': str(e)}), 400
 
 
-@app.route('/api/relatorio-html', methods=['GET'])
-def gerar_relatorio_html():
-    """Gera relatório em HTML"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM livros ORDER BY titulo')
-    livros = cursor.fetchall()
-    conn.close()
-
-    if not livros:
-        return jsonify({'erro': 'Nenhum livro para gerar relatório'}), 400
-
-    # Calcula estatísticas
-    total_livros = len(livros)
-    autores_unicos = len(set(l[2] for l in livros))
-    valor_total = sum(l[4] for l in livros)
-    preco_medio = valor_total / total_livros
-
-    # Gera HTML
-    html = f"""<!DOCTYPE html>
+# Modelos do relatório HTML (montados uma única vez, na importação do módulo)
+RELATORIO_CABECALHO = """<!DOCTYPE html>
 <html lang="pt-BR">
 <head>
     <meta charset="UTF-8">
@@ -461,7 +579,7 @@ def gerar_relatorio_html():
 <body>
     <div class="container">
         <h1>📚 Relatório de Livraria</h1>
-        <div class="subtitle">Gerado em {datetime.now().strftime('%d/%m/%Y às %H:%M:%S')}</div>
+        <div class="subtitle">Gerado em {gerado_em}</div>
 
         <div class="stats">
             <div class="stat-card">
@@ -496,18 +614,17 @@ def gerar_relatorio_html():
             <tbody>
 """
 
-    for livro in livros:
-        html += f"""
+RELATORIO_LINHA = """
                 <tr>
-                    <td>{livro[0]}</td>
-                    <td>{livro[1]}</td>
-                    <td>{livro[2]}</td>
-                    <td>{livro[3]}</td>
-                    <td class="preco">R$ {livro[4]:.2f}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td class="preco">R$ {:.2f}</td>
                 </tr>
 """
 
-    html += """
+RELATORIO_RODAPE = """
             </tbody>
         </table>
 
@@ -520,57 +637,105 @@ def gerar_relatorio_html():
 </html>
 """
 
-    # Salva o relatório
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    report_path = REPORTS_DIR / f"relatorio_{timestamp}.html"
 
-    with open(report_path, 'w', encoding='utf-8') as f:
-        f.write(html)
+@app.route('/api/relatorio-html', methods=['GET'])
+def gerar_relatorio_html():
+    """Gera relatório em HTML"""
+    cursor = get_conn().cursor()
+
+    # Total e soma dos preços vêm da linha mantida pelos triggers de livros_stats
+    cursor.execute('SELECT total, soma_preco FROM livros_stats')
+    total_livros, valor_total = cursor.fetchone()
+
+    if not total_livros:
+        return jsonify({'erro': 'Nenhum livro para gerar relatório'}), 400
+
+    preco_medio = valor_total / total_livros
+    cursor.execute('SELECT COUNT(DISTINCT autor) FROM livros')
+    autores_unicos = cursor.fetchone()[0]
+
+    agora = datetime.now()
+
+    cursor.execute(f'SELECT {COLUNAS_LIVRO} FROM livros ORDER BY titulo')
+
+    # Gera HTML
+    cabecalho = RELATORIO_CABECALHO.format(
+        gerado_em=agora.strftime('%d/%m/%Y às %H:%M:%S'),
+        total_livros=total_livros,
+        autores_unicos=autores_unicos,
+        valor_total=valor_total,
+        preco_medio=preco_medio,
+    )
+
+    def gerar():
+        yield cabecalho
+        for livro in cursor:
+            yield RELATORIO_LINHA.format(*livro)
+        yield RELATORIO_RODAPE
+
+    timestamp = gerar_timestamp(agora)
+    download_name = f'relatorio_livraria_{timestamp}.html'
+
+    # Salva uma cópia em REPORTS_DIR apenas quando solicitado (?salvar=1)
+    if request.args.get('salvar') == '1':
+        report_path = REPORTS_DIR / f"relatorio_{timestamp}.html"
 
-    return send_file(report_path, as_attachment=True, download_name=f'relatorio_livraria_{timestamp}.html')
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.writelines(gerar())
+
+        return send_file(report_path, as_attachment=True, download_name=download_name)
+
+    return Response(gerar(), mimetype='text/html',
+                    headers={'Content-Disposition': f'attachment; filename={download_name}'})
 
 
 @app.route('/api/estatisticas', methods=['GET'])
 def obter_estatisticas():
     """Retorna estatísticas para gráficos"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cursor = get_conn().cursor()
 
-    # Livros por autor
+    # Livros por autor (top 10), por década e distribuição de preços em uma
+    # única consulta; a coluna "tipo" indica a qual estatística a linha pertence
     cursor.execute('''
-        SELECT autor, COUNT(*) as total
-        FROM livros
-        GROUP BY autor
-        ORDER BY total DESC
-        LIMIT 10
-    ''')
-    livros_por_autor = [{'autor': row[0], 'total': row[1]} for row in cursor.fetchall()]
-
-    # Livros por década
-    cursor.execute('''
-        SELECT (ano_publicacao / 10) * 10 as decada, COUNT(*) as total
-        FROM livros
-        GROUP BY decada
-        ORDER BY decada
-    ''')
-    livros_por_decada = [{'decada': f"{int(row[0])}s", 'total': row[1]} for row in cursor.fetchall()]
-
-    # Distribuição de preços
-    cursor.execute('''
-        SELECT
-            CASE
-                WHEN preco < 20 THEN 'Até R$ 20'
-                WHEN preco < 50 THEN 'R$ 20-50'
-                WHEN preco < 100 THEN 'R$ 50-100'
-                ELSE 'Acima de R$ 100'
-            END as faixa,
-            COUNT(*) as total
+        SELECT 'autor' AS tipo, autor AS chave, total, -total AS ordem
+        FROM (
+            SELECT autor, COUNT(*) AS total
+            FROM livros
+            GROUP BY autor
+            ORDER BY total DESC
+            LIMIT 10
+        )
+        UNION ALL
+        SELECT 'decada', (ano_publicacao / 10) * 10, COUNT(*), (ano_publicacao / 10) * 10
         FROM livros
+        GROUP BY 2
+        UNION ALL
+        SELECT 'preco', faixa, COUNT(*), faixa
+        FROM (
+            SELECT
+                CASE
+                    WHEN preco < 20 THEN 'Até R$ 20'
+                    WHEN preco < 50 THEN 'R$ 20-50'
+                    WHEN preco < 100 THEN 'R$ 50-100'
+                    ELSE 'Acima de R$ 100'
+                END as faixa
+            FROM livros
+        )
         GROUP BY faixa
+        ORDER BY tipo, ordem
     ''')
-    distribuicao_precos = [{'faixa': row[0], 'total': row[1]} for row in cursor.fetchall()]
 
-    conn.close()
+    livros_por_autor = []
+    livros_por_decada = []
+    distribuicao_precos = []
+
+    for tipo, chave, total, _ in cursor:
+        if tipo == 'autor':
+            livros_por_autor.append({'autor': chave, 'total': total})
+        elif tipo == 'decada':
+            livros_por_decada.append({'decada': f"{int(chave)}s", 'total': total})
+        else:
+            distribuicao_precos.append({'faixa': chave, 'total': total})
 
     return jsonify({
         'livros_por_autor': livros_por_autor,
@@ -603,4 +768,6 @@ if __name__ == '__main__':
     # Abre o navegador após 1.5 segundos
     threading.Timer(1.5, abrir_navegador).start()
 
-    app.run(debug=True, use_reloader=False)
+    # Servidor WSGI de produção com várias threads (leituras concorrentes via WAL)
+    app.debug = False
+    serve(app, host='127.0.0.1', port=5000, threads=SERVIDOR_THREADS)
@@ -10,15 +10,130 @@ manipulação de arquivos CSV para importação/exportação, e sistema de backu
 
 import sqlite3
 import csv
+import io
+import sys
+import functools
+import math
 import os
+import queue
+import re
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-import shutil
+import time
+
+# Formatos aceitos para ano e preço, checados antes de int()/float() para evitar exceções
+# em linhas inválidas: sinal opcional, dígitos com "_" entre eles, espaços nas pontas e,
+# no preço, parte decimal ("3", "3.5", "3.", ".5"). Notação científica ("1e3"), "inf" e
+# "nan" são recusadas de propósito, embora float() as aceite: preços infinitos ou NaN
+# corrompem os totais de livros_stats mantidos por triggers
+_ANO_RE = re.compile(r'\s*[+-]?\d+(?:_\d+)*\s*$')
+_PRECO_RE = re.compile(r'\s*[+-]?(?:\d+(?:_\d+)*(?:\.(?:\d+(?:_\d+)*)?)?|\.\d+(?:_\d+)*)\s*$')
+
+
+class PoolConexoes:
+    """Uma conexão de escrita e uma fila de conexões somente leitura para o mesmo banco"""
+
+    def __init__(self, db_path, pragmas=(), leitores=None):
+        """Abre a conexão de escrita e as conexões de leitura (padrão: uma por CPU)"""
+        # O modo WAL é definido pela conexão de escrita antes de abrir as de leitura,
+        # permitindo várias leituras em paralelo com a escrita
+        self._escritor = self._conectar(db_path, pragmas)
+        self._trava_escrita = threading.Lock()
+
+        self._leitores = queue.Queue()
+        for _ in range(leitores or os.cpu_count() or 1):
+            conn = self._conectar(db_path, pragmas)
+            conn.execute("PRAGMA query_only=1")
+            self._leitores.put(conn)
+
+    @staticmethod
+    def _conectar(db_path, pragmas):
+        """Abre uma conexão em modo autocommit e aplica os PRAGMAs"""
+        conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        for pragma in pragmas:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def escritor(self):
+        """Empresta a conexão de escrita (uma thread por vez)"""
+        with self._trava_escrita:
+            yield self._escritor
+
+    @contextmanager
+    def leitor(self):
+        """Empresta uma conexão de leitura da fila, aguardando se todas estiverem em uso"""
+        conn = self._leitores.get()
+        try:
+            yield conn
+        finally:
+            self._leitores.put(conn)
+
+    def fechar(self):
+        """Fecha todas as conexões do pool"""
+        with self._trava_escrita:
+            self._escritor.close()
+        while True:
+            try:
+                self._leitores.get_nowait().close()
+            except queue.Empty:
+                break
 
 
 class SistemaLivraria:
     """Classe principal para gerenciar o sistema de livraria"""
 
+    # PRAGMAs aplicados ao abrir a conexão (journal_mode=WAL fica gravado no arquivo)
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA mmap_size=268435456",
+    )
+
+    # Comandos SQL usados repetidamente; com as conexões persistentes do pool, o texto
+    # idêntico reaproveita a instrução já compilada no cache de instruções do sqlite3
+    SQL_INSERIR = '''
+        INSERT INTO livros (titulo, autor, ano_publicacao, preco)
+        VALUES (?, ?, ?, ?)
+    '''
+    SQL_SELECIONAR_TODOS = 'SELECT id, titulo, autor, ano_publicacao, preco FROM livros ORDER BY id'
+    SQL_BUSCAR_AUTOR = '''
+        SELECT id, titulo, autor, ano_publicacao, preco FROM livros
+        WHERE autor LIKE ?
+        ORDER BY titulo
+    '''
+    SQL_BUSCAR_AUTOR_FTS = '''
+        SELECT l.id, l.titulo, l.autor, l.ano_publicacao, l.preco
+        FROM livros_fts f JOIN livros l ON l.id = f.rowid
+        WHERE f.autor LIKE ?
+        ORDER BY l.titulo
+    '''
+    # Autores e trechos usados para conferir, na inicialização, se a busca pelo índice FTS5
+    # devolve as mesmas linhas que o LIKE comum (inclui trechos curtos com acento)
+    AMOSTRA_AUTORES = ('São Paulo', 'Ana María', 'Machado de Assis')
+    AMOSTRA_TRECHOS = ('ão', 'ía', 'Mach', 'São', 'aría')
+    SQL_TITULO_PRECO_POR_ID = 'SELECT titulo, preco FROM livros WHERE id = ?'
+    SQL_ATUALIZAR_PRECO = 'UPDATE livros SET preco = ? WHERE id = ?'
+    SQL_REMOVER = 'DELETE FROM livros WHERE id = ?'
+
+    # Cabeçalho das tabelas de livros exibidas no terminal
+    CABECALHO_TABELA = f"{'ID':<5} {'Título':<35} {'Autor':<25} {'Ano':<6} {'Preço':<10}\n"
+    # Formato de cada linha (id, título, autor, ano, preço), aplicado com o operador %
+    FORMATO_LINHA = "%-5d %-35s %-25s %-6d R$ %-8.2f\n"
+
+    # Quantidade de linhas lidas por fetchmany ao exibir e exportar
+    TAMANHO_LOTE = 1000
+
+    # Tamanho do buffer (bytes) usado ao gravar a exportação CSV
+    BUFFER_ESCRITA = 1024 * 1024
+
+    # Intervalo mínimo (segundos) entre backups automáticos
+    BACKUP_INTERVALO = 60
+
     def __init__(self):
         """Inicializa o sistema e cria a estrutura de diretórios"""
         self.base_dir = Path("meu_sistema_livraria")
@@ -26,6 +141,25 @@ class SistemaLivraria:
         self.backups_dir = self.base_dir / "backups"
         self.exports_dir = self.base_dir / "exports"
         self.db_path = self.data_dir / "livraria.db"
+        self._ultimo_backup = None
+
+        # Cache LRU das buscas por autor, por instância
+        self._buscar_por_autor_cached = functools.lru_cache(maxsize=128)(self._consultar_autor)
+        self._versao_dados = None
+        self._interativo = sys.stdin.isatty()
+
+        # Opções do menu principal -> método que as trata
+        self._handlers = {
+            '1': self._menu_adicionar,
+            '2': self.exibir_todos_livros,
+            '3': self._menu_atualizar_preco,
+            '4': self._menu_remover,
+            '5': self._menu_buscar,
+            '6': self._menu_exportar,
+            '7': self._menu_importar,
+            '8': self._menu_backup,
+            '9': self._menu_sair,
+        }
 
         self._criar_estrutura_diretorios()
         self._inicializar_banco()
@@ -38,43 +172,118 @@ class SistemaLivraria:
         print("✓ Estrutura de diretórios criada/verificada")
 
     def _inicializar_banco(self):
-        """Cria a tabela de livros se não existir"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS livros (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titulo TEXT NOT NULL,
-                autor TEXT NOT NULL,
-                ano_publicacao INTEGER NOT NULL,
-                preco REAL NOT NULL
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
+        """Abre o pool de conexões e cria a tabela de livros se não existir"""
+        self._pool = PoolConexoes(self.db_path, self.PRAGMAS)
+
+        with self._pool.escritor() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS livros (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    titulo TEXT NOT NULL,
+                    autor TEXT NOT NULL,
+                    ano_publicacao INTEGER NOT NULL,
+                    preco REAL NOT NULL
+                )
+            ''')
+
+            self._busca_fts = self._criar_indice_autores(conn)
+
+            if self._busca_fts and not self._conferir_busca_fts(conn):
+                print("⚠ Busca FTS5 diverge do LIKE neste SQLite; a busca por autor percorrerá a tabela")
+                self._busca_fts = False
+
         print("✓ Banco de dados inicializado")
 
-    def _fazer_backup(self):
-        """Cria um backup do banco de dados com timestamp"""
+    def _criar_indice_autores(self, conn):
+        """Cria o índice FTS5 (trigram) de autores; retorna False se o SQLite não tiver FTS5"""
+        existia = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'livros_fts'").fetchone()
+
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                # O tokenizer trigram permite que LIKE '%trecho%' use o índice
+                conn.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS livros_fts
+                    USING fts5(autor, content='livros', content_rowid='id', tokenize='trigram')
+                ''')
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS livros_fts_ai AFTER INSERT ON livros BEGIN
+                        INSERT INTO livros_fts (rowid, autor) VALUES (NEW.id, NEW.autor);
+                    END
+                ''')
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS livros_fts_ad AFTER DELETE ON livros BEGIN
+                        INSERT INTO livros_fts (livros_fts, rowid, autor) VALUES ('delete', OLD.id, OLD.autor);
+                    END
+                ''')
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS livros_fts_au AFTER UPDATE OF autor ON livros BEGIN
+                        INSERT INTO livros_fts (livros_fts, rowid, autor) VALUES ('delete', OLD.id, OLD.autor);
+                        INSERT INTO livros_fts (rowid, autor) VALUES (NEW.id, NEW.autor);
+                    END
+                ''')
+
+                # Indexa os livros já cadastrados na primeira execução
+                if not existia:
+                    conn.execute("INSERT INTO livros_fts (livros_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            print("⚠ SQLite sem suporte a FTS5; a busca por autor percorrerá a tabela")
+            return False
+
+        return True
+
+    def _conferir_busca_fts(self, conn):
+        """Confere, em uma transação desfeita ao final, se a busca via FTS5 devolve o mesmo que o LIKE"""
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(self.SQL_INSERIR, [(f"Amostra {autor}", autor, 2000, 0)
+                                                for autor in self.AMOSTRA_AUTORES])
+            for trecho in self.AMOSTRA_TRECHOS:
+                parametros = (f'%{trecho}%',)
+                via_fts = conn.execute(self._sql_busca_autor(trecho), parametros).fetchall()
+                via_like = conn.execute(self.SQL_BUSCAR_AUTOR, parametros).fetchall()
+                if sorted(via_fts) != sorted(via_like):
+                    return False
+            return True
+        finally:
+            conn.execute("ROLLBACK")
+
+    def fechar(self):
+        """Fecha as conexões com o banco de dados"""
+        self._pool.fechar()
+
+    def _fazer_backup(self, forcar=False):
+        """Cria um backup do banco de dados com timestamp (no máximo um a cada BACKUP_INTERVALO segundos)"""
         if not self.db_path.exists():
             print("⚠ Banco de dados não encontrado para backup")
             return
 
+        agora = time.monotonic()
+        if not forcar and self._ultimo_backup is not None and agora - self._ultimo_backup < self.BACKUP_INTERVALO:
+            return
+
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         backup_nome = f"backup_livraria_{timestamp}.db"
         backup_path = self.backups_dir / backup_nome
 
-        shutil.copy2(self.db_path, backup_path)
+        # API de backup online do SQLite: cópia consistente a partir de uma conexão de leitura
+        destino = sqlite3.connect(backup_path)
+        try:
+            with self._pool.leitor() as conn:
+                conn.backup(destino)
+        finally:
+            destino.close()
+        self._ultimo_backup = agora
         print(f"✓ Backup criado: {backup_nome}")
 
         self._limpar_backups_antigos()
 
     def _limpar_backups_antigos(self):
         """Mantém apenas os 5 backups mais recentes"""
+        # O timestamp no nome (%Y-%m-%d_%H-%M-%S) já ordena os backups, sem stat() por arquivo
         backups = sorted(self.backups_dir.glob("backup_livraria_*.db"),
-                        key=os.path.getmtime, reverse=True)
+                        key=lambda p: p.name, reverse=True)
 
         # Remove backups excedentes (mantém apenas os 5 mais recentes)
         for backup in backups[5:]:
@@ -83,172 +292,219 @@ class SistemaLivraria:
 
     def adicionar_livro(self, titulo, autor, ano_publicacao, preco):
         """Adiciona um novo livro ao banco de dados"""
-        # Validação de entradas
+        # Validação de entradas; textos (menu) são conferidos antes da conversão
+        if ((isinstance(ano_publicacao, str) and not _ANO_RE.match(ano_publicacao)) or
+                (isinstance(preco, str) and not _PRECO_RE.match(preco))):
+            print("✗ Ano ou preço inválido")
+            return False
+
         try:
             ano_publicacao = int(ano_publicacao)
             preco = float(preco)
-
-            if ano_publicacao < 0 or ano_publicacao > datetime.now().year:
-                print("✗ Ano de publicação inválido")
-                return False
-
-            if preco < 0:
-                print("✗ Preço não pode ser negativo")
-                return False
-
         except ValueError:
             print("✗ Ano ou preço inválido")
             return False
 
-        self._fazer_backup()
+        if not math.isfinite(preco):
+            print("✗ Ano ou preço inválido")
+            return False
+
+        if ano_publicacao < 0 or ano_publicacao > datetime.now().year:
+            print("✗ Ano de publicação inválido")
+            return False
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if preco < 0:
+            print("✗ Preço não pode ser negativo")
+            return False
 
-        cursor.execute('''
-            INSERT INTO livros (titulo, autor, ano_publicacao, preco)
-            VALUES (?, ?, ?, ?)
-        ''', (titulo, autor, ano_publicacao, preco))
+        self._fazer_backup()
 
-        conn.commit()
-        conn.close()
+        with self._pool.escritor() as conn:
+            conn.execute(self.SQL_INSERIR, (titulo, autor, ano_publicacao, preco))
 
+        self._limpar_cache_busca()
         print(f"✓ Livro '{titulo}' adicionado com sucesso!")
         return True
 
+    def _lotes(self, cursor, primeiro_lote):
+        """Gera os lotes de linhas do cursor (fetchmany), começando por um lote já lido"""
+        lote = primeiro_lote
+        while lote:
+            yield lote
+            lote = cursor.fetchmany(self.TAMANHO_LOTE)
+
     def exibir_todos_livros(self):
         """Exibe todos os livros cadastrados"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM livros ORDER BY id')
-        livros = cursor.fetchall()
-
-        conn.close()
-
-        if not livros:
-            print("\nNenhum livro cadastrado.")
-            return
-
-        print("\n" + "="*100)
-        print(f"{'ID':<5} {'Título':<35} {'Autor':<25} {'Ano':<6} {'Preço':<10}")
-        print("="*100)
-
-        for livro in livros:
-            id_livro, titulo, autor, ano, preco = livro
-            print(f"{id_livro:<5} {titulo:<35} {autor:<25} {ano:<6} R$ {preco:<8.2f}")
-
-        print("="*100)
-        print(f"Total de livros: {len(livros)}\n")
+        with self._pool.leitor() as conn:
+            cursor = conn.execute(self.SQL_SELECIONAR_TODOS)
+            lote = cursor.fetchmany(self.TAMANHO_LOTE)
+
+            if not lote:
+                print("\nNenhum livro cadastrado.")
+                return
+
+            # Monta a saída em um buffer e a envia ao terminal uma vez por lote
+            buffer = io.StringIO()
+            buffer.write("\n" + "="*100 + "\n")
+            buffer.write(self.CABECALHO_TABELA)
+            buffer.write("="*100 + "\n")
+
+            total = 0
+            for lote in self._lotes(cursor, lote):
+                buffer.write("".join(self.FORMATO_LINHA % livro for livro in lote))
+                total += len(lote)
+                sys.stdout.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        buffer.write("="*100 + "\n")
+        buffer.write(f"Total de livros: {total}\n\n")
+        sys.stdout.write(buffer.getvalue())
 
     def atualizar_preco(self, id_livro, novo_preco):
         """Atualiza o preço de um livro"""
+        if isinstance(novo_preco, str) and not _PRECO_RE.match(novo_preco):
+            print("✗ Preço inválido")
+            return False
+
         try:
             novo_preco = float(novo_preco)
-            if novo_preco < 0:
-                print("✗ Preço não pode ser negativo")
-                return False
         except ValueError:
             print("✗ Preço inválido")
             return False
 
-        self._fazer_backup()
+        if not math.isfinite(novo_preco):
+            print("✗ Preço inválido")
+            return False
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if novo_preco < 0:
+            print("✗ Preço não pode ser negativo")
+            return False
 
-        cursor.execute('SELECT titulo FROM livros WHERE id = ?', (id_livro,))
-        resultado = cursor.fetchone()
+        with self._pool.escritor() as conn:
+            # Valida antes do backup: ID inexistente ou preço igual não alteram o banco
+            resultado = conn.execute(self.SQL_TITULO_PRECO_POR_ID, (id_livro,)).fetchone()
 
-        if not resultado:
-            print(f"✗ Livro com ID {id_livro} não encontrado")
-            conn.close()
-            return False
+            if not resultado:
+                print(f"✗ Livro com ID {id_livro} não encontrado")
+                return False
+
+            if resultado[1] == novo_preco:
+                print(f"✓ O livro '{resultado[0]}' já custa R$ {novo_preco:.2f}")
+                return True
 
-        cursor.execute('UPDATE livros SET preco = ? WHERE id = ?', (novo_preco, id_livro))
-        conn.commit()
-        conn.close()
+            self._fazer_backup()
 
+            conn.execute(self.SQL_ATUALIZAR_PRECO, (novo_preco, id_livro))
+
+        self._limpar_cache_busca()
         print(f"✓ Preço do livro '{resultado[0]}' atualizado para R$ {novo_preco:.2f}")
         return True
 
     def remover_livro(self, id_livro):
         """Remove um livro do banco de dados"""
-        self._fazer_backup()
-
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._pool.escritor() as conn:
+            resultado = conn.execute(self.SQL_TITULO_PRECO_POR_ID, (id_livro,)).fetchone()
 
-        cursor.execute('SELECT titulo FROM livros WHERE id = ?', (id_livro,))
-        resultado = cursor.fetchone()
+            if not resultado:
+                print(f"✗ Livro com ID {id_livro} não encontrado")
+                return False
 
-        if not resultado:
-            print(f"✗ Livro com ID {id_livro} não encontrado")
-            conn.close()
-            return False
+            self._fazer_backup()
 
-        cursor.execute('DELETE FROM livros WHERE id = ?', (id_livro,))
-        conn.commit()
-        conn.close()
+            conn.execute(self.SQL_REMOVER, (id_livro,))
 
+        self._limpar_cache_busca()
         print(f"✓ Livro '{resultado[0]}' removido com sucesso!")
         return True
 
+    def _sql_busca_autor(self, autor):
+        """Escolhe a consulta da busca por autor: pelo índice FTS5 ou percorrendo a tabela"""
+        # O trigram não indexa trechos com menos de 3 caracteres (no SQLite 3.40 não devolve
+        # nada se tiverem acento), nem trechos com os curingas do LIKE; esses usam o LIKE comum
+        if self._busca_fts and len(autor) >= 3 and '%' not in autor and '_' not in autor:
+            return self.SQL_BUSCAR_AUTOR_FTS
+        return self.SQL_BUSCAR_AUTOR
+
+    def _consultar_autor(self, autor):
+        """Executa a busca por autor e devolve as linhas como tupla (memoizada em __init__)"""
+        sql = self._sql_busca_autor(autor)
+        with self._pool.leitor() as conn:
+            return tuple(conn.execute(sql, (f'%{autor}%',)))
+
+    def _limpar_cache_busca(self):
+        """Descarta as buscas memoizadas (chamado após qualquer alteração nos livros)"""
+        self._buscar_por_autor_cached.cache_clear()
+
     def buscar_por_autor(self, autor):
         """Busca livros por autor"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT * FROM livros
-            WHERE autor LIKE ?
-            ORDER BY titulo
-        ''', (f'%{autor}%',))
+        # data_version muda quando outra conexão (ex.: a versão web) altera o banco; é lida
+        # sempre na conexão de escrita, pois o valor só é comparável dentro da mesma conexão
+        # (as escritas feitas pelo próprio pool já limpam o cache)
+        with self._pool.escritor() as conn:
+            versao = conn.execute("PRAGMA data_version").fetchone()[0]
+        if versao != self._versao_dados:
+            self._limpar_cache_busca()
+            self._versao_dados = versao
 
-        livros = cursor.fetchall()
-        conn.close()
+        livros = self._buscar_por_autor_cached(autor)
 
         if not livros:
             print(f"\nNenhum livro encontrado para o autor '{autor}'.")
             return
 
-        print(f"\n{'='*100}")
-        print(f"Livros do autor '{autor}':")
-        print(f"{'='*100}")
-        print(f"{'ID':<5} {'Título':<35} {'Autor':<25} {'Ano':<6} {'Preço':<10}")
-        print("="*100)
+        # Monta a tabela inteira em um buffer e a envia ao terminal em uma única escrita
+        buffer = io.StringIO()
+        buffer.write(f"\n{'='*100}\n")
+        buffer.write(f"Livros do autor '{autor}':\n")
+        buffer.write(f"{'='*100}\n")
+        buffer.write(self.CABECALHO_TABELA)
+        buffer.write("="*100 + "\n")
 
-        for livro in livros:
-            id_livro, titulo, autor_nome, ano, preco = livro
-            print(f"{id_livro:<5} {titulo:<35} {autor_nome:<25} {ano:<6} R$ {preco:<8.2f}")
+        buffer.write("".join(self.FORMATO_LINHA % livro for livro in livros))
 
-        print("="*100)
-        print(f"Total encontrado: {len(livros)}\n")
+        buffer.write("="*100 + "\n")
+        buffer.write(f"Total encontrado: {len(livros)}\n\n")
+        sys.stdout.write(buffer.getvalue())
 
     def exportar_para_csv(self):
         """Exporta todos os livros para um arquivo CSV"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM livros ORDER BY id')
-        livros = cursor.fetchall()
-
-        conn.close()
+        csv_path = self.exports_dir / "livros_exportados.csv"
 
-        if not livros:
-            print("✗ Nenhum livro para exportar")
-            return False
+        with self._pool.leitor() as conn:
+            cursor = conn.execute(self.SQL_SELECIONAR_TODOS)
+            lote = cursor.fetchmany(self.TAMANHO_LOTE)
 
-        csv_path = self.exports_dir / "livros_exportados.csv"
+            if not lote:
+                print("✗ Nenhum livro para exportar")
+                return False
 
-        with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['ID', 'Título', 'Autor', 'Ano de Publicação', 'Preço'])
-            writer.writerows(livros)
+            with open(csv_path, 'w', newline='', encoding='utf-8', buffering=self.BUFFER_ESCRITA) as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['ID', 'Título', 'Autor', 'Ano de Publicação', 'Preço'])
+                total = 0
+                for lote in self._lotes(cursor, lote):
+                    writer.writerows(lote)
+                    total += len(lote)
 
-        print(f"✓ {len(livros)} livro(s) exportado(s) para: {csv_path}")
+        print(f"✓ {total} livro(s) exportado(s) para: {csv_path}")
         return True
 
+    def _linhas_validas(self, reader):
+        """Gera (titulo, autor, ano, preco) das linhas do CSV, avisando sobre as inválidas"""
+        for row in reader:
+            if len(row) > 5:
+                print(f"⚠ Erro ao importar linha {row}: colunas demais ({len(row)})")
+            elif len(row) == 5:
+                # Ignora o ID do CSV e deixa o banco gerar automaticamente
+                _, titulo, autor, ano, preco = row
+                if not _ANO_RE.match(ano):
+                    print(f"⚠ Erro ao importar linha {row}: ano inválido {ano!r}")
+                elif not _PRECO_RE.match(preco):
+                    print(f"⚠ Erro ao importar linha {row}: preço inválido {preco!r}")
+                else:
+                    yield titulo, autor, int(ano), float(preco)
+
     def importar_de_csv(self, caminho_csv=None):
         """Importa livros de um arquivo CSV"""
         if caminho_csv is None:
@@ -262,120 +518,129 @@ class SistemaLivraria:
 
         self._fazer_backup()
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        importados = 0
-        with open(caminho_csv, 'r', encoding='utf-8') as csvfile:
+        # O executemany consome o leitor CSV diretamente: as linhas são lidas,
+        # convertidas e inseridas em fluxo, sem montar uma lista intermediária
+        with self._pool.escritor() as conn, conn, open(caminho_csv, 'r', encoding='utf-8') as csvfile:
             reader = csv.reader(csvfile)
             next(reader)  # Pula o cabeçalho
 
-            for row in reader:
-                if len(row) >= 5:
-                    try:
-                        # Ignora o ID do CSV e deixa o banco gerar automaticamente
-                        _, titulo, autor, ano, preco = row
-                        ano = int(ano)
-                        preco = float(preco)
-
-                        cursor.execute('''
-                            INSERT INTO livros (titulo, autor, ano_publicacao, preco)
-                            VALUES (?, ?, ?, ?)
-                        ''', (titulo, autor, ano, preco))
-
-                        importados += 1
-                    except (ValueError, sqlite3.Error) as e:
-                        print(f"⚠ Erro ao importar linha {row}: {e}")
-
-        conn.commit()
-        conn.close()
+            conn.execute("BEGIN")
+            importados = conn.executemany(self.SQL_INSERIR, self._linhas_validas(reader)).rowcount
 
+        self._limpar_cache_busca()
         print(f"✓ {importados} livro(s) importado(s) com sucesso!")
         return True
 
-    def menu_principal(self):
-        """Exibe e gerencia o menu principal do sistema"""
-        while True:
-            print("\n" + "="*50)
-            print("    SISTEMA DE GERENCIAMENTO DE LIVRARIA")
-            print("="*50)
-            print("1. Adicionar novo livro")
-            print("2. Exibir todos os livros")
-            print("3. Atualizar preço de um livro")
-            print("4. Remover um livro")
-            print("5. Buscar livros por autor")
-            print("6. Exportar dados para CSV")
-            print("7. Importar dados de CSV")
-            print("8. Fazer backup do banco de dados")
-            print("9. Sair")
-            print("="*50)
-
-            opcao = input("Escolha uma opção: ").strip()
-
-            if opcao == '1':
-                print("\n--- ADICIONAR NOVO LIVRO ---")
-                titulo = input("Título: ").strip()
-                autor = input("Autor: ").strip()
-                ano = input("Ano de publicação: ").strip()
-                preco = input("Preço (R$): ").strip()
-
-                if titulo and autor and ano and preco:
-                    self.adicionar_livro(titulo, autor, ano, preco)
-                else:
-                    print("✗ Todos os campos são obrigatórios")
-
-            elif opcao == '2':
-                self.exibir_todos_livros()
-
-            elif opcao == '3':
-                print("\n--- ATUALIZAR PREÇO ---")
-                id_livro = input("ID do livro: ").strip()
-                novo_preco = input("Novo preço (R$): ").strip()
-
-                if id_livro and novo_preco:
-                    self.atualizar_preco(id_livro, novo_preco)
-                else:
-                    print("✗ ID e preço são obrigatórios")
-
-            elif opcao == '4':
-                print("\n--- REMOVER LIVRO ---")
-                id_livro = input("ID do livro: ").strip()
-
-                if id_livro:
-                    confirma = input(f"Confirma a remoção do livro ID {id_livro}? (s/n): ").strip().lower()
-                    if confirma == 's':
-                        self.remover_livro(id_livro)
-                else:
-                    print("✗ ID é obrigatório")
+    def _ler(self, mensagem):
+        """Lê uma linha da entrada (input() no terminal, readline() quando redirecionada)"""
+        if self._interativo:
+            return input(mensagem).strip()
+
+        linha = sys.stdin.readline()
+        if not linha:
+            raise EOFError
+        return linha.strip()
+
+    def _menu_adicionar(self):
+        """Opção 1: lê os dados e adiciona um novo livro"""
+        print("\n--- ADICIONAR NOVO LIVRO ---")
+        titulo = self._ler("Título: ")
+        autor = self._ler("Autor: ")
+        ano = self._ler("Ano de publicação: ")
+        preco = self._ler("Preço (R$): ")
+
+        if titulo and autor and ano and preco:
+            self.adicionar_livro(titulo, autor, ano, preco)
+        else:
+            print("✗ Todos os campos são obrigatórios")
 
-            elif opcao == '5':
-                print("\n--- BUSCAR POR AUTOR ---")
-                autor = input("Nome do autor: ").strip()
+    def _menu_atualizar_preco(self):
+        """Opção 3: lê o ID e o novo preço de um livro"""
+        print("\n--- ATUALIZAR PREÇO ---")
+        id_livro = self._ler("ID do livro: ")
+        novo_preco = self._ler("Novo preço (R$): ")
 
-                if autor:
-                    self.buscar_por_autor(autor)
-                else:
-                    print("✗ Nome do autor é obrigatório")
+        if id_livro and novo_preco:
+            self.atualizar_preco(id_livro, novo_preco)
+        else:
+            print("✗ ID e preço são obrigatórios")
 
-            elif opcao == '6':
-                print("\n--- EXPORTAR PARA CSV ---")
-                self.exportar_para_csv()
+    def _menu_remover(self):
+        """Opção 4: lê o ID e remove o livro após confirmação"""
+        print("\n--- REMOVER LIVRO ---")
+        id_livro = self._ler("ID do livro: ")
 
-            elif opcao == '7':
-                print("\n--- IMPORTAR DE CSV ---")
-                caminho = input("Caminho do arquivo CSV (Enter para padrão): ").strip()
-                self.importar_de_csv(caminho if caminho else None)
+        if id_livro:
+            confirma = self._ler(f"Confirma a remoção do livro ID {id_livro}? (s/n): ").lower()
+            if confirma == 's':
+                self.remover_livro(id_livro)
+        else:
+            print("✗ ID é obrigatório")
 
-            elif opcao == '8':
-                print("\n--- FAZER BACKUP ---")
-                self._fazer_backup()
+    def _menu_buscar(self):
+        """Opção 5: lê o nome do autor e busca seus livros"""
+        print("\n--- BUSCAR POR AUTOR ---")
+        autor = self._ler("Nome do autor: ")
 
-            elif opcao == '9':
-                print("\n✓ Encerrando o sistema...")
-                break
+        if autor:
+            self.buscar_por_autor(autor)
+        else:
+            print("✗ Nome do autor é obrigatório")
+
+    def _menu_exportar(self):
+        """Opção 6: exporta os livros para CSV"""
+        print("\n--- EXPORTAR PARA CSV ---")
+        self.exportar_para_csv()
+
+    def _menu_importar(self):
+        """Opção 7: lê o caminho e importa livros de um CSV"""
+        print("\n--- IMPORTAR DE CSV ---")
+        caminho = self._ler("Caminho do arquivo CSV (Enter para padrão): ")
+        self.importar_de_csv(caminho if caminho else None)
+
+    def _menu_backup(self):
+        """Opção 8: cria um backup imediatamente"""
+        print("\n--- FAZER BACKUP ---")
+        self._fazer_backup(forcar=True)
+
+    def _menu_sair(self):
+        """Opção 9: fecha o banco e sinaliza o fim do menu"""
+        print("\n✓ Encerrando o sistema...")
+        self.fechar()
+        return True
 
-            else:
-                print("\n✗ Opção inválida! Escolha uma opção de 1 a 9.")
+    def menu_principal(self):
+        """Exibe e gerencia o menu principal do sistema"""
+        try:
+            while True:
+                # Em uso não interativo (entrada redirecionada), o menu não é redesenhado
+                if self._interativo:
+                    print("\n" + "="*50)
+                    print("    SISTEMA DE GERENCIAMENTO DE LIVRARIA")
+                    print("="*50)
+                    print("1. Adicionar novo livro")
+                    print("2. Exibir todos os livros")
+                    print("3. Atualizar preço de um livro")
+                    print("4. Remover um livro")
+                    print("5. Buscar livros por autor")
+                    print("6. Exportar dados para CSV")
+                    print("7. Importar dados de CSV")
+                    print("8. Fazer backup do banco de dados")
+                    print("9. Sair")
+                    print("="*50)
+
+                opcao = self._ler("Escolha uma opção: ")
+                handler = self._handlers.get(opcao)
+
+                if handler is None:
+                    print("\n✗ Opção inválida! Escolha uma opção de 1 a 9.")
+                elif handler():
+                    # Apenas a opção 9 retorna True
+                    break
+
+        except EOFError:
+            # Fim da entrada redirecionada (ou Ctrl+D) encerra como a opção 9
+            self._menu_sair()
 
 
 def main():